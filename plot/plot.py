@@ -1,17 +1,36 @@
+import functools
 import h5py
 import os
 
+import matplotlib
+# the figures only go to files, so no interactive backend is needed
+matplotlib.use('Agg')
 import matplotlib.colors as mcolors
+from matplotlib.lines import Line2D
 from mpl_toolkits.axes_grid1.axes_divider import make_axes_locatable
 import matplotlib.pyplot as plt
 import numpy as np
 import scipy.special
-import scipy.optimize as opt
 
-plt.rcParams.update({
+# long paths are rendered in chunks instead of one huge agg path
+plt.rcParams["agg.path.chunksize"] = 10000
+plt.rcParams["path.simplify"] = True
+
+# LaTeX text rendering for the publication figures, diagnostic plots use the much faster mathtext
+publication_rc = {
     "text.usetex": True,
     "text.latex.preamble": '\\usepackage{siunitx}'
-})
+}
+publication_dpi = 1000
+# below matplotlib's default of 100, the per-file diagnostic plots are only looked at on screen
+diagnostic_dpi = 72
+# the heatmaps are at most 33x33 cells, more pixels than this are indistinguishable in print
+heatmap_dpi = 200
+
+# parsed to rgba once, matplotlib takes the rows and (N, 4) arrays of them without converting again
+tab_colors = mcolors.to_rgba_array(list(mcolors.TABLEAU_COLORS.values()))
+# wraps around for more groups than there are Tableau colors
+tab_cmap = mcolors.ListedColormap(tab_colors)
 
 magnetization_name = "magnetization"
 field_squared_name = "field_squared"
@@ -19,76 +38,113 @@ magnetization_squared_name = "magnetization_squared"
 energy_name = "energy"
 energy_squared_name = "energy_squared"
 
+# raw data chunk cache used for every opened measurement file (libhdf5 default is 1 MiB)
+chunk_cache_bytes = 64 * 1024 * 1024
+chunk_cache_slots = 1_000_003
+
+
+def list_measurement_files(sub_folder_name, extension=""):
+    file_list = [entry.path for entry in os.scandir(sub_folder_name)
+                 if entry.name.startswith("out_") and entry.name.endswith(extension)]
+    file_list.sort()
+    return file_list
+
+
+def open_measurement_file(file):
+    return h5py.File(file, 'r', rdcc_nbytes=chunk_cache_bytes, rdcc_nslots=chunk_cache_slots, rdcc_w0=0.75)
+
 
 def fit_function(x, a, z):
     return a * x ** z
 
 
+def power_law_fit(x, y, yerr):
+    # weighted linear least squares for log(y) = log(a) + z * log(x), the error of log(y) being yerr / y
+    weights = y / yerr
+    design = np.column_stack((np.ones_like(x), np.log(x))) * weights[:, None]
+    target = np.log(y) * weights
+    solution = np.linalg.lstsq(design, target, rcond=None)[0]
+    chi2 = ((design @ solution - target) ** 2).sum() / (len(x) - len(solution))
+    log_pcov = np.linalg.inv(design.T @ design) * chi2
+    popt = np.array([np.exp(solution[0]), solution[1]])
+    jacobian = np.diag([popt[0], 1.])  # d(a, z) / d(log(a), z)
+    return popt, jacobian @ log_pcov @ jacobian.T
+
+
 def magnetization_exact(beta):
-    if beta < 0.440686793509772:
-        return 0
-    else:
-        return (1. - 1. / np.sinh(2 * beta) ** 4) ** (1 / 8)
+    beta = np.asarray(beta, dtype=float)
+    answer = np.zeros_like(beta)
+    ordered = beta >= 0.440686793509772
+    answer[ordered] = (1. - 1. / np.sinh(2 * beta[ordered]) ** 4) ** (1 / 8)
+    return answer
 
 
 def ene_exact(J):  # exact internal energy in thermodynamic limit (for h=0)\n",
     J2 = 2 * J
-    k = 4 * np.sinh(J2) ** 2 / np.cosh(J2) ** 4
+    sinh_J2 = np.sinh(J2)
+    cosh_J2 = np.cosh(J2)
+    k = 4 * sinh_J2 ** 2 / cosh_J2 ** 4
     eK = scipy.special.ellipk(k)
     answer = 1 + (2 / np.pi) * (2 * np.tanh(J2) ** 2 - 1) * eK
-    return -J * np.cosh(J2) * answer / np.sinh(J2)
+    return -J * cosh_J2 * answer / sinh_J2
 
 
 def specific_heat_exact(beta):  # exact cpecific_heat in thermodynamic limit (for h=0)\n",
     B2 = 2 * beta
+    tanh_B2_squared = np.tanh(B2) ** 2
     k = 4 * np.sinh(B2) ** 2 / np.cosh(B2) ** 4
     Kk = scipy.special.ellipk(k)
     Ek = scipy.special.ellipe(k)
-    kp = 2 * (np.tanh(B2) ** 2) - 1
+    kp = 2 * tanh_B2_squared - 1
     answer = 2 * Kk - 2 * Ek - (1 - kp) * ((np.pi / 2) + kp * Kk)
-    return ((2 * beta ** 2 / np.pi) / (np.tanh(B2) ** 2)) * answer
-
-
-def append_observable(name, measurements_group_, observable_list, observable_error_list):
-    observable_group = measurements_group_.get(name)
-    temp = -42
-    if "bootstrap_mean_10000_100000" in observable_group.attrs:
-        temp = observable_group.attrs["bootstrap_mean_10000_100000"]
-        print("hi")
-    else:
-        temp = observable_group.attrs["bootstrap_mean"]
-    if np.isinf(temp) or temp > 1e200:
-        observable_list.append(-42)
-    else:
-        observable_list.append(temp)
-
-    if "bootstrap_variance_10000_100000" in observable_group.attrs:
-        temp = observable_group.attrs["bootstrap_variance_10000_100000"]
-        print("hey")
+    return ((2 * beta ** 2 / np.pi) / tanh_B2_squared) * answer
+
+
+@functools.lru_cache(maxsize=8)
+def exact_curves(beta_min, beta_max, n):
+    beta = np.linspace(beta_min, beta_max, n)
+    curves = (beta, magnetization_exact(beta), ene_exact(beta) / beta, specific_heat_exact(beta) / beta)
+    for curve in curves:
+        curve.setflags(write=False)  # shared between all callers of the cache
+    return curves
+
+
+def read_observable(name, measurements_group_):
+    observable_attrs = measurements_group_.get(name).attrs
+    mean = observable_attrs.get("bootstrap_mean_10000_100000")
+    if mean is None:
+        mean = observable_attrs["bootstrap_mean"]
+    variance = observable_attrs.get("bootstrap_variance_10000_100000")
+    if variance is None:
+        variance = observable_attrs["bootstrap_variance"]
+    if np.isinf(mean) or mean > 1e200:
+        mean = -42
+    if np.isinf(variance) or variance > 1e200 or np.isnan(variance):
+        error = 42
     else:
-        temp = observable_group.attrs["bootstrap_variance"]
-    if np.isinf(temp) or temp > 1e200 or np.isnan(temp):
-        observable_error_list.append(42)
-    else:
-        observable_error_list.append(np.sqrt(temp))
+        error = np.sqrt(variance)
+    return mean, error
 
 
-def make_auto_correlation_plot_to_ax(name, measurements_group_, ax_, suffix="", label=""):
+def read_auto_correlation(name, measurements_group_, suffix=""):
     observable_group = measurements_group_.get(name)
-    observable_auto_correlation_dataset = observable_group.get("auto_correlation" + suffix)
-    observable_auto_correlation = np.zeros(observable_auto_correlation_dataset.size)
-    observable_auto_correlation_dataset.read_direct(observable_auto_correlation,
-                                                    np.s_[0:observable_auto_correlation_dataset.size],
-                                                    np.s_[0:observable_auto_correlation_dataset.size])
+    # float32 is plenty for plotting and halves the data handed to the renderer
+    return observable_group.get("auto_correlation" + suffix).astype(np.float32)[...]
 
-    ax_.plot(np.arange(observable_auto_correlation.size), observable_auto_correlation, label=label)
 
+def make_auto_correlation_plot_to_ax(observable_auto_correlation, ax_, label=""):
+    ax_.plot(np.arange(observable_auto_correlation.size, dtype=np.float32), observable_auto_correlation, label=label)
 
-def make_auto_correlation_plot(name, measurements_group_, suffix=""):
-    fig_, ax_ = plt.subplots()
+
+def make_auto_correlation_plot(observable_auto_correlation, fig_ax=None):
+    if fig_ax is None:
+        fig_, ax_ = plt.subplots()
+    else:
+        fig_, ax_ = fig_ax
+        ax_.clear()
     fig_: plt.Figure
     ax_: plt.Axes
-    make_auto_correlation_plot_to_ax(name, measurements_group_, ax_, suffix)
+    make_auto_correlation_plot_to_ax(observable_auto_correlation, ax_)
     ax_.set_xlabel(r"t")
     ax_.set_ylabel(r"$\bar{\Gamma}_{m}$")
     # ax_.set_yscale("log")
@@ -110,214 +166,248 @@ def make_observable_plot(name, inverse_betas, observable_list, observable_error_
     return fig_, ax_
 
 
+def load_base_file(file, auto_correlation_names=(energy_name,)):
+    with open_measurement_file(file) as f:
+        level0_group = f.get("level0")
+
+        measurements_group = level0_group.get("measurements")
+
+        data = {"beta": level0_group.attrs["beta"]}
+        for name in (energy_name, magnetization_name, energy_squared_name, magnetization_squared_name):
+            if name in measurements_group:
+                data[name] = read_observable(name, measurements_group)
+        for name in auto_correlation_names:
+            if name in measurements_group:
+                data[name + "_auto_correlation"] = read_auto_correlation(name, measurements_group)
+    return data
+
+
 def base_plot(sub_folder_name="std_hmc/"):
-    betas = []
-    inverse_betas = []
-    magnetizations = []
-    magnetizations_errors = []
-    magnetizations_squared = []
-    magnetizations_squared_errors = []
-    energies = []
-    energies_errors = []
-    energies_squared = []
-    energies_squared_errors = []
-
-    for file in os.listdir(sub_folder_name):
-        if file.startswith("out_"):
-            file = sub_folder_name + file
-            print(file)
-            f = h5py.File(file, 'r')
+    file_list = list_measurement_files(sub_folder_name)
+
+    n = len(file_list)
+    # nan marks the observables a file does not have
+    betas = np.full(n, np.nan)
+    magnetizations = np.full(n, np.nan)
+    magnetizations_errors = np.full(n, np.nan)
+    magnetizations_squared = np.full(n, np.nan)
+    magnetizations_squared_errors = np.full(n, np.nan)
+    energies = np.full(n, np.nan)
+    energies_errors = np.full(n, np.nan)
+    energies_squared = np.full(n, np.nan)
+    energies_squared_errors = np.full(n, np.nan)
+    has_magnetization = np.zeros(n, dtype=bool)
+    has_magnetization_squared = np.zeros(n, dtype=bool)
+    has_energy = np.zeros(n, dtype=bool)
+    has_energy_squared = np.zeros(n, dtype=bool)
+    auto_correlation_fig, auto_correlation_ax = plt.subplots()
+
+    for k, file in enumerate(file_list):
+        print(file)
+        # the commented auto correlation plots below need their observable added to auto_correlation_names
+        data = load_base_file(file)
+        betas[k] = data["beta"]
+
+        if energy_name in data:
+            energies[k], energies_errors[k] = data[energy_name]
+            has_energy[k] = True
+            fig, ax = make_auto_correlation_plot(data[energy_name + "_auto_correlation"],
+                                                 fig_ax=(auto_correlation_fig, auto_correlation_ax))
+            fig.savefig(sub_folder_name + energy_name + f"_auto_correlation_{1. / betas[k]}.png",
+                        dpi=diagnostic_dpi)
+
+        if magnetization_name in data:
+            magnetizations[k], magnetizations_errors[k] = data[magnetization_name]
+            has_magnetization[k] = True
+            # fig, ax = make_auto_correlation_plot(data[magnetization_name + "_auto_correlation"],
+            #                                      fig_ax=(auto_correlation_fig, auto_correlation_ax))
+            # fig.savefig(sub_folder_name + magnetization_name + "_auto_correlation.png", dpi=diagnostic_dpi)
+
+        if energy_squared_name in data:
+            energies_squared[k], energies_squared_errors[k] = data[energy_squared_name]
+            has_energy_squared[k] = True
+            # fig, ax = make_auto_correlation_plot(data[energy_squared_name + "_auto_correlation"],
+            #                                      fig_ax=(auto_correlation_fig, auto_correlation_ax))
+            # fig.savefig(sub_folder_name + energy_squared_name + "_auto_correlation.png", dpi=diagnostic_dpi)
+
+        if magnetization_squared_name in data:
+            magnetizations_squared[k], magnetizations_squared_errors[k] = data[magnetization_squared_name]
+            has_magnetization_squared[k] = True
+            # fig, ax = make_auto_correlation_plot(data[magnetization_squared_name + "_auto_correlation"],
+            #                                      fig_ax=(auto_correlation_fig, auto_correlation_ax))
+            # fig.savefig(sub_folder_name + magnetization_squared_name + "_auto_correlation.png", dpi=diagnostic_dpi)
+
+    plt.close(auto_correlation_fig)
+    inverse_betas = 1. / betas
+
+    with plt.rc_context(publication_rc):
+        # magnetizations
+        beta_lin, m_exact, e_exact, c_exact = exact_curves(0.25, 3, 1000)
+        if has_magnetization.any():
+            fig, ax = make_observable_plot(magnetization_name, inverse_betas[has_magnetization],
+                                           magnetizations[has_magnetization], magnetizations_errors[has_magnetization])
+            ax.set_ylabel("$<m>$")
+            ax.plot(1. / beta_lin, m_exact, label="Thermodynamic limit")
+            ax.plot(1. / beta_lin, -m_exact, label="-Thermodynamic limit")
+            ax.legend()
+            fig.savefig(sub_folder_name + magnetization_name + ".png", dpi=publication_dpi)
+            plt.close(fig)
+
+        # magnetizations_squared
+        if has_magnetization_squared.any():
+            m_squared_exact = m_exact ** 2  # todo
+            fig, ax = make_observable_plot(magnetization_squared_name, inverse_betas[has_magnetization_squared],
+                                           magnetizations_squared[has_magnetization_squared],
+                                           magnetizations_squared_errors[has_magnetization_squared])
+            ax.set_ylabel("$<m^2>$")
+            ax.plot(1. / beta_lin, m_squared_exact, label="Thermodynamic limit")
+            ax.legend()
+            fig.savefig(sub_folder_name + magnetization_squared_name + ".png", dpi=publication_dpi)
+            plt.close(fig)
+
+        # energies
+        if has_energy.any():
+            fig, ax = make_observable_plot(energy_name, inverse_betas[has_energy], energies[has_energy],
+                                           energies_errors[has_energy])
+            # ax.set_ylim(0, 1.2)
+            ax.set_ylabel("$<e>$")
+            ax.plot(1. / beta_lin, e_exact, label="Thermodynamic limit")
+            ax.legend()
+            fig.savefig(sub_folder_name + energy_name + ".png", dpi=publication_dpi)
+            plt.close(fig)
+
+        # energies_squared, the specific heat needs the energy of the same file as well
+        has_specific_heat = has_energy_squared & has_energy
+        if has_specific_heat.any():
+            fig, ax = make_observable_plot(energy_squared_name, inverse_betas[has_specific_heat],
+                                           energies_squared[has_specific_heat] - energies[has_specific_heat] ** 2,
+                                           energies_squared_errors[has_specific_heat])
+            ax.set_ylabel("$<C>$")
+            ax.plot(1. / beta_lin, c_exact, label="Thermodynamic limit")
+            ax.legend()
+            fig.savefig(sub_folder_name + energy_squared_name + ".png", dpi=publication_dpi)
+            plt.close(fig)
+
+
+def load_info_file(file, observable_name):
+    with open_measurement_file(file) as f:
+        level0_group = f.get("level0")
 
-            level0_group = f.get("level0")
+        measurements_group = level0_group.get("measurements")
+        if observable_name not in measurements_group:
+            return None
+        observable_group = measurements_group.get(observable_name)
+        observable_attrs = observable_group.attrs
+        # only the names are snapshotted for the suffix scan, reading every attribute value is far slower
+        attr_names = set(observable_attrs.keys())
+        last_sufix = ""
+        for i in range(1000, 100001, 1000):
+            sufix = f"_{i}_{100000}"
+            if "int_auto_correlation_time" + sufix in attr_names:
+                last_sufix = sufix
+                break
 
-            measurements_group = level0_group.get("measurements")
+        data = {
+            "int_auto_correlation_time": observable_attrs["int_auto_correlation_time" + last_sufix],
+            "int_auto_correlation_time_bias": observable_attrs["int_auto_correlation_time_bias" + last_sufix],
+            "int_auto_correlation_time_stat_error": observable_attrs[
+                "int_auto_correlation_time_stat_error" + last_sufix],
+            "gamma": level0_group.attrs["gamma"],
+            "system_size": len(level0_group.get("h")),
+            "tick_time": level0_group.attrs["tick_time"],
+            "inter_type": level0_group.attrs["inter_type"],
+            "nu_pre_level0": level0_group.attrs["nu_pre"],
+            "nu_post_level0": level0_group.attrs["nu_post"],
+            "multilevel": "level1" in f,
+        }
+        if data["multilevel"]:
+            level1_group = f.get("level1")
+            data["nu_pre_level1"] = level1_group.attrs["nu_pre"]
+            data["nu_post_level1"] = level1_group.attrs["nu_post"]
+        else:
+            data["nu_pre_level1"] = -1
+            data["nu_post_level1"] = -1
 
-            betas.append(level0_group.attrs["beta"])
-            inverse_betas.append(1. / betas[-1])
-
-            if energy_name in measurements_group:
-                append_observable(energy_name, measurements_group, energies, energies_errors)
-                fig, ax = make_auto_correlation_plot(energy_name, measurements_group)
-                fig.savefig(sub_folder_name + energy_name + f"_auto_correlation_{inverse_betas[-1]}.png")
-                plt.close(fig)
-
-            if magnetization_name in measurements_group:
-                append_observable(magnetization_name, measurements_group, magnetizations, magnetizations_errors)
-                # fig, ax = make_auto_correlation_plot(magnetization_name, measurements_group)
-                # fig.savefig(sub_folder_name + magnetization_name + "_auto_correlation.png")
-                # plt.close(fig)
-
-            if energy_squared_name in measurements_group:
-                append_observable(energy_squared_name, measurements_group, energies_squared, energies_squared_errors)
-                # fig, ax = make_auto_correlation_plot(energy_squared_name, measurements_group)
-                # fig.savefig(sub_folder_name + energy_squared_name + "_auto_correlation.png")
-                # plt.close(fig)
-
-            if magnetization_squared_name in measurements_group:
-                append_observable(magnetization_squared_name, measurements_group, magnetizations_squared,
-                                  magnetizations_squared_errors)
-                # fig, ax = make_auto_correlation_plot(magnetization_squared_name, measurements_group)
-                # fig.savefig(sub_folder_name + magnetization_squared_name + "_auto_correlation.png")
-                # plt.close(fig)
-
-    # magnetizations
-    beta_lin = np.linspace(0.25, 3, 1000)
-    if len(magnetizations) > 0:
-        m_exact = np.array([magnetization_exact(temp) for temp in beta_lin])
-        fig, ax = make_observable_plot(magnetization_name, inverse_betas, magnetizations, magnetizations_errors)
-        ax.set_ylabel("$<m>$")
-        ax.plot(1. / beta_lin, m_exact, label="Thermodynamic limit")
-        ax.plot(1. / beta_lin, -m_exact, label="-Thermodynamic limit")
-        ax.legend()
-        fig.savefig(sub_folder_name + magnetization_name + ".png", dpi=1000)
-        plt.close(fig)
-
-    # magnetizations_squared
-    if len(magnetizations_squared) > 0:
-        m_squared_exact = m_exact ** 2  # todo
-        fig, ax = make_observable_plot(magnetization_squared_name, inverse_betas, magnetizations_squared,
-                                       magnetizations_squared_errors)
-        ax.set_ylabel("$<m^2>$")
-        ax.plot(1. / beta_lin, m_squared_exact, label="Thermodynamic limit")
-        ax.legend()
-        fig.savefig(sub_folder_name + magnetization_squared_name + ".png", dpi=1000)
-        plt.close(fig)
-
-    # energies
-    if len(energies) > 0:
-        e_exact = np.array([ene_exact(temp) / temp for temp in beta_lin])
-        fig, ax = make_observable_plot(energy_name, inverse_betas, energies, energies_errors)
-        # ax.set_ylim(0, 1.2)
-        ax.set_ylabel("$<e>$")
-        ax.plot(1. / beta_lin, e_exact, label="Thermodynamic limit")
-        ax.legend()
-        fig.savefig(sub_folder_name + energy_name + ".png", dpi=1000)
-        plt.close(fig)
-
-    # energies_squared
-    if len(energies_squared) > 0:
-        energies_squared = np.array(energies_squared)
-        energies = np.array(energies)
-        c_exact = np.array([specific_heat_exact(temp) / temp for temp in beta_lin])
-        fig, ax = make_observable_plot(energy_squared_name, inverse_betas, energies_squared - energies ** 2,
-                                       energies_squared_errors)
-        ax.set_ylabel("$<C>$")
-        ax.plot(1. / beta_lin, c_exact, label="Thermodynamic limit")
-        ax.legend()
-        fig.savefig(sub_folder_name + energy_squared_name + ".png", dpi=1000)
-        plt.close(fig)
+        if data["system_size"] == 32 * 32:
+            data["auto_correlation"] = read_auto_correlation(observable_name, measurements_group, last_sufix)
+    return data
 
 
+@plt.rc_context(publication_rc)
 def info_plot(sub_folder_name, observable_name=magnetization_name):
-    int_auto_correlation_time = []
-    int_auto_correlation_time_bias = []
-    int_auto_correlation_time_stat_error = []
-    gamma = []
-    system_size = []
-    tick_time = []
-    interpolation_type = []
-    nu_pre_level0 = []
-    nu_post_level0 = []
-    nu_pre_level1 = []
-    nu_post_level1 = []
-    bootstrap_variance = []
-    bootstrap_mean = []
-    file_list = []
+    file_list = list_measurement_files(sub_folder_name, ".h5")
     fig_correl, ax_correl = plt.subplots()
     fig_correl: plt.Figure
     ax_correl: plt.Axes
-    for file in os.listdir(sub_folder_name):
-        if file.startswith("out_") and file.endswith(".h5"):
-            file_list.append(sub_folder_name + file)
 
-    for file in file_list:
+    n = len(file_list)
+    int_auto_correlation_time = np.empty(n)
+    int_auto_correlation_time_bias = np.empty(n)
+    int_auto_correlation_time_stat_error = np.empty(n)
+    gamma = np.empty(n)
+    system_size = np.empty(n, dtype=int)
+    tick_time = np.empty(n)
+    interpolation_type = np.empty(n, dtype=int)
+    nu_pre_level0 = np.empty(n, dtype=int)
+    nu_post_level0 = np.empty(n, dtype=int)
+    nu_pre_level1 = np.empty(n, dtype=int)
+    nu_post_level1 = np.empty(n, dtype=int)
+    has_observable = np.zeros(n, dtype=bool)
+
+    for k, file in enumerate(file_list):
         print(file)
-        f = h5py.File(file, 'r')
-
-        level0_group = f.get("level0")
-
-        measurements_group = level0_group.get("measurements")
-        if observable_name in measurements_group:
-            observable_group = measurements_group.get(observable_name)
-            last_sufix = ""
-            temp_int_auto_correlation_time = []
-            temp_int_auto_correlation_time_stat_error = []
-            temp_x = []
-            for i in range(1000, 100001, 1000):
-                sufix = f"_{i}_{100000}"
-                if "int_auto_correlation_time" + sufix in observable_group.attrs:
-                    temp_int_auto_correlation_time.append(observable_group.attrs["int_auto_correlation_time" + sufix])
-                    temp_int_auto_correlation_time_stat_error.append(
-                        observable_group.attrs["int_auto_correlation_time_stat_error" + sufix])
-                    temp_x.append(100000 - i)
-                    if len(last_sufix) == 0:
-                        last_sufix = sufix
-            fig_, ax_ = plt.subplots()
-            fig_: plt.Figure
-            ax_: plt.Axes
-            ax_.errorbar(temp_x, temp_int_auto_correlation_time, temp_int_auto_correlation_time_stat_error, fmt='o')
-            title = f"Grid side length =" + file.split('/')[1].split('_')[1][2:]
-
-            int_auto_correlation_time.append(observable_group.attrs["int_auto_correlation_time" + last_sufix])
-            int_auto_correlation_time_bias.append(observable_group.attrs["int_auto_correlation_time_bias" + last_sufix])
-            int_auto_correlation_time_stat_error.append(
-                observable_group.attrs["int_auto_correlation_time_stat_error" + last_sufix])
-            gamma.append(level0_group.attrs["gamma"])
-            system_size.append(len(level0_group.get("h")))
-
-            tick_time.append(level0_group.attrs["tick_time"])
-            interpolation_type.append(level0_group.attrs["inter_type"])
-            nu_pre_level0.append(level0_group.attrs["nu_pre"])
-            nu_post_level0.append(level0_group.attrs["nu_post"])
-            label = "abc"
-            if "level1" in f:
-                if gamma[-1]>1:
-                    label = "MLHMC  W-cycle"
-                else:
-                    label = "MLHMC V-cycle"
-                title = "MLHMC " + title
-                level1_group = f.get("level1")
-                nu_pre_level1.append(level1_group.attrs["nu_pre"])
-                nu_post_level1.append(level1_group.attrs["nu_post"])
-            else:
+        data = load_info_file(file, observable_name)
+        if data is None:
+            continue
+        has_observable[k] = True
+        int_auto_correlation_time[k] = data["int_auto_correlation_time"]
+        int_auto_correlation_time_bias[k] = data["int_auto_correlation_time_bias"]
+        int_auto_correlation_time_stat_error[k] = data["int_auto_correlation_time_stat_error"]
+        gamma[k] = data["gamma"]
+        system_size[k] = data["system_size"]
+        tick_time[k] = data["tick_time"]
+        interpolation_type[k] = data["inter_type"]
+        nu_pre_level0[k] = data["nu_pre_level0"]
+        nu_post_level0[k] = data["nu_post_level0"]
+        nu_pre_level1[k] = data["nu_pre_level1"]
+        nu_post_level1[k] = data["nu_post_level1"]
+
+        if system_size[k] == 32 * 32:
+            if not data["multilevel"]:
                 label = "HMC"
-                title = "HMC " + title
-                nu_pre_level1.append(-1)
-                nu_post_level1.append(-1)
-
-            if system_size[-1] == 32 * 32:
-                make_auto_correlation_plot_to_ax(observable_name, measurements_group, ax_correl, last_sufix, label)
-                ax_correl.set_xlabel(r"t")
-                ax_correl.set_ylabel(r"$\bar{\Gamma}_{m}$")
-                # ax_.set_yscale("log")
-                ax_correl.set_xlim(-1, 6000)
-                ax_correl.set_ylim(0, 1.05)
-                fig_correl.set_tight_layout(True)
-
-            ax_.set_title(title)
-            ax_.set_xlabel("$N_{ensemble}$")
-            ax_.set_ylabel(r"$\tau$")
-            ax_.set_yscale("log")
-            fig_.set_tight_layout(True)
-            # fig_.savefig(file.split('.')[0] + observable_name + "test")
-            plt.close(fig_)
+            elif gamma[k] > 1:
+                label = "MLHMC  W-cycle"
+            else:
+                label = "MLHMC V-cycle"
+            make_auto_correlation_plot_to_ax(data["auto_correlation"], ax_correl, label)
+            ax_correl.set_xlabel(r"t")
+            ax_correl.set_ylabel(r"$\bar{\Gamma}_{m}$")
+            # ax_.set_yscale("log")
+            ax_correl.set_xlim(-1, 6000)
+            ax_correl.set_ylim(0, 1.05)
+            fig_correl.set_tight_layout(True)
 
     ax_correl.legend()
-    fig_correl.savefig(sub_folder_name + observable_name + f"_auto_correlation_{42}.png", dpi=1000)
+    fig_correl.savefig(sub_folder_name + observable_name + f"_auto_correlation_{42}.png", dpi=publication_dpi)
     plt.close(fig_correl)
-    int_auto_correlation_time = np.array(int_auto_correlation_time)
-    int_auto_correlation_time_bias = np.array(int_auto_correlation_time_bias)
-    int_auto_correlation_time_stat_error = np.array(int_auto_correlation_time_stat_error)
-    gamma = np.array(gamma)
-    system_size = np.array(system_size)
-    tick_time = np.array(tick_time)
-    interpolation_type = np.array(interpolation_type)
-    nu_pre_level0 = np.array(nu_pre_level0)
-    nu_post_level0 = np.array(nu_post_level0)
-    nu_pre_level1 = np.array(nu_pre_level1)
-    nu_post_level1 = np.array(nu_post_level1)
-
-    fig_, (ax1_, ax2_, ax3_) = plt.subplots(3, 1, figsize=(12, 9))
+    # nothing to plot or fit without a single run of the observable
+    if not has_observable.any():
+        return
+    int_auto_correlation_time = int_auto_correlation_time[has_observable]
+    int_auto_correlation_time_bias = int_auto_correlation_time_bias[has_observable]
+    int_auto_correlation_time_stat_error = int_auto_correlation_time_stat_error[has_observable]
+    gamma = gamma[has_observable]
+    system_size = system_size[has_observable]
+    tick_time = tick_time[has_observable]
+    interpolation_type = interpolation_type[has_observable]
+    nu_pre_level0 = nu_pre_level0[has_observable]
+    nu_post_level0 = nu_post_level0[has_observable]
+    nu_pre_level1 = nu_pre_level1[has_observable]
+    nu_post_level1 = nu_post_level1[has_observable]
+    side_length = np.sqrt(system_size, dtype=np.float64)
+
+    # only ax1_ ends up in the saved figure, the tau and bias panels are drawn to a figure that is never saved
+    unsaved_fig_, (ax1_, ax2_, ax3_) = plt.subplots(3, 1, figsize=(12, 9))
     fig_, ax1_ = plt.subplots(1, 1)
     fig_: plt.Figure
     ax1_: plt.Axes
@@ -329,68 +419,40 @@ def info_plot(sub_folder_name, observable_name=magnetization_name):
     base_int_auto_correlation_time = 42
     ls = [0, 0]
     labels = ["HMC", "Multilevel"]
-    x_wo_bias_correction_hmc = []
-    y_wo_bias_correction_hmc = []
-    yerr_wo_bias_correction_hmc = []
-    x_wo_bias_correction_multi_hmc = []
-    y_wo_bias_correction_multi_hmc = []
-    yerr_wo_bias_correction_multi_hmc = []
-    y_w_bias_correction_hmc = []
-    y_w_bias_correction_multi_hmc = []
-    hmc_first = True
-    mlhmc_first = True
-    for i, nu_pre in enumerate(nu_pre_level1):
-        if nu_pre == -1:
-            if hmc_first:
-                ls[0] = ax1_.errorbar(np.sqrt(system_size[i]), int_auto_correlation_time[i],
-                                      int_auto_correlation_time_stat_error[i],
-                                      fmt='.', mfc='red', mec='red', ecolor='red', label="HMC", zorder=2)
-                hmc_first = False
-            else:
-                ls[0] = ax1_.errorbar(np.sqrt(system_size[i]), int_auto_correlation_time[i],
-                                      int_auto_correlation_time_stat_error[i],
-                                      fmt='.', mfc='red', mec='red', ecolor='red', zorder=2)
-            ax2_.errorbar(np.sqrt(system_size[i]), int_auto_correlation_time[i] + int_auto_correlation_time_bias[i],
-                          int_auto_correlation_time_stat_error[i],
-                          fmt='.', mfc='red', mec='red', ecolor='red')
-            if system_size[i] < 33 * 33:
-                x_wo_bias_correction_hmc.append(np.sqrt(system_size[i]))
-                y_wo_bias_correction_hmc.append(int_auto_correlation_time[i])
-                y_w_bias_correction_hmc.append(int_auto_correlation_time[i] + int_auto_correlation_time_bias[i])
-                yerr_wo_bias_correction_hmc.append(int_auto_correlation_time_stat_error[i])
-                if system_size[i] < 5 * 5:
-                    x_wo_bias_correction_multi_hmc.append(np.sqrt(system_size[i]))
-                    y_wo_bias_correction_multi_hmc.append(int_auto_correlation_time[i])
-                    y_w_bias_correction_multi_hmc.append(
-                        int_auto_correlation_time[i] + int_auto_correlation_time_bias[i])
-                    yerr_wo_bias_correction_multi_hmc.append(int_auto_correlation_time_stat_error[i])
-            ax3_.scatter(np.sqrt(system_size[i]), int_auto_correlation_time_bias[i], c='red')
-        else:
-            if mlhmc_first:
-                ls[1] = ax1_.errorbar(np.sqrt(system_size[i]), int_auto_correlation_time[i],
-                                      int_auto_correlation_time_stat_error[i],
-                                      fmt='.', mfc='green', mec='green', ecolor='green', label="MLHMC", zorder=2)
-                mlhmc_first = False
-            else:
-                ls[1] = ax1_.errorbar(np.sqrt(system_size[i]), int_auto_correlation_time[i],
-                                      int_auto_correlation_time_stat_error[i],
-                                      fmt='.', mfc='green', mec='green', ecolor='green', zorder=2)
-            ax2_.errorbar(np.sqrt(system_size[i]), int_auto_correlation_time[i] + int_auto_correlation_time_bias[i],
-                          int_auto_correlation_time_stat_error[i],
-                          fmt='.', mfc='green', mec='green', ecolor='green')
-            if system_size[i] < 33 * 33:
-                x_wo_bias_correction_multi_hmc.append(np.sqrt(system_size[i]))
-                y_wo_bias_correction_multi_hmc.append(int_auto_correlation_time[i])
-                y_w_bias_correction_multi_hmc.append(int_auto_correlation_time[i] + int_auto_correlation_time_bias[i])
-                yerr_wo_bias_correction_multi_hmc.append(int_auto_correlation_time_stat_error[i])
-            ax3_.scatter(np.sqrt(system_size[i]), int_auto_correlation_time_bias[i], c='green')
-
-    popt, pcov = opt.curve_fit(fit_function, x_wo_bias_correction_hmc, y_wo_bias_correction_hmc,
-                               sigma=yerr_wo_bias_correction_hmc)
+    hmc = nu_pre_level1 == -1
+    mlhmc = ~hmc
+    int_auto_correlation_time_w_bias = int_auto_correlation_time + int_auto_correlation_time_bias
+    if hmc.any():
+        ls[0] = ax1_.errorbar(side_length[hmc], int_auto_correlation_time[hmc],
+                              int_auto_correlation_time_stat_error[hmc],
+                              fmt='.', color='red', mfc='red', mec='red', ecolor='red', label="HMC", zorder=2)
+        ax2_.errorbar(side_length[hmc], int_auto_correlation_time_w_bias[hmc],
+                      int_auto_correlation_time_stat_error[hmc],
+                      fmt='.', color='red', mfc='red', mec='red', ecolor='red')
+        ax3_.scatter(side_length[hmc], int_auto_correlation_time_bias[hmc], c='red')
+    if mlhmc.any():
+        ls[1] = ax1_.errorbar(side_length[mlhmc], int_auto_correlation_time[mlhmc],
+                              int_auto_correlation_time_stat_error[mlhmc],
+                              fmt='.', color='green', mfc='green', mec='green', ecolor='green', label="MLHMC", zorder=2)
+        ax2_.errorbar(side_length[mlhmc], int_auto_correlation_time_w_bias[mlhmc],
+                      int_auto_correlation_time_stat_error[mlhmc],
+                      fmt='.', color='green', mfc='green', mec='green', ecolor='green')
+        ax3_.scatter(side_length[mlhmc], int_auto_correlation_time_bias[mlhmc], c='green')
+
+    # the smallest HMC lattices are also part of the MLHMC fit
+    fit_hmc = hmc & (system_size < 33 * 33)
+    fit_multi_hmc = (mlhmc & (system_size < 33 * 33)) | (hmc & (system_size < 5 * 5))
+    x_wo_bias_correction_hmc = side_length[fit_hmc]
+    y_wo_bias_correction_hmc = int_auto_correlation_time[fit_hmc]
+    y_w_bias_correction_hmc = int_auto_correlation_time_w_bias[fit_hmc]
+    yerr_wo_bias_correction_hmc = int_auto_correlation_time_stat_error[fit_hmc]
+    x_wo_bias_correction_multi_hmc = side_length[fit_multi_hmc]
+    y_wo_bias_correction_multi_hmc = int_auto_correlation_time[fit_multi_hmc]
+    y_w_bias_correction_multi_hmc = int_auto_correlation_time_w_bias[fit_multi_hmc]
+    yerr_wo_bias_correction_multi_hmc = int_auto_correlation_time_stat_error[fit_multi_hmc]
+
+    popt, pcov = power_law_fit(x_wo_bias_correction_hmc, y_wo_bias_correction_hmc, yerr_wo_bias_correction_hmc)
     f = open(sub_folder_name + observable_name + "_output.txt", "w")
-    x_wo_bias_correction_hmc = np.array(x_wo_bias_correction_hmc)
-    y_wo_bias_correction_hmc = np.array(y_wo_bias_correction_hmc)
-    yerr_wo_bias_correction_hmc = np.array(yerr_wo_bias_correction_hmc)
     chi2 = (((y_wo_bias_correction_hmc - fit_function(x_wo_bias_correction_hmc,
                                                       *popt)) / yerr_wo_bias_correction_hmc) ** 2).sum() / (
                    len(x_wo_bias_correction_hmc) - len(popt))
@@ -402,11 +464,8 @@ def info_plot(sub_folder_name, observable_name=magnetization_name):
     y_fit = fit_function(x_fit, *popt)
     ax1_.plot(x_fit, y_fit, label="HMC fit", zorder=1)
 
-    popt, pcov = opt.curve_fit(fit_function, x_wo_bias_correction_multi_hmc, y_wo_bias_correction_multi_hmc,
-                               sigma=yerr_wo_bias_correction_multi_hmc)
-    x_wo_bias_correction_multi_hmc = np.array(x_wo_bias_correction_multi_hmc)
-    y_wo_bias_correction_multi_hmc = np.array(y_wo_bias_correction_multi_hmc)
-    yerr_wo_bias_correction_multi_hmc = np.array(yerr_wo_bias_correction_multi_hmc)
+    popt, pcov = power_law_fit(x_wo_bias_correction_multi_hmc, y_wo_bias_correction_multi_hmc,
+                               yerr_wo_bias_correction_multi_hmc)
     chi2 = (((y_wo_bias_correction_multi_hmc - fit_function(x_wo_bias_correction_multi_hmc,
                                                             *popt)) / yerr_wo_bias_correction_multi_hmc) ** 2).sum() / (
                    len(x_wo_bias_correction_multi_hmc) - len(popt))
@@ -419,14 +478,13 @@ def info_plot(sub_folder_name, observable_name=magnetization_name):
 
     ax1_.legend(loc="upper left")
 
-    popt, pcov = opt.curve_fit(fit_function, x_wo_bias_correction_hmc, y_w_bias_correction_hmc,
-                               sigma=yerr_wo_bias_correction_hmc)
+    popt, pcov = power_law_fit(x_wo_bias_correction_hmc, y_w_bias_correction_hmc, yerr_wo_bias_correction_hmc)
     # print("hmc w_bias_correction", observable_name, popt, np.sqrt(pcov[0, 0]), np.sqrt(pcov[1, 1]))
     y_fit = fit_function(x_fit, *popt)
     ax2_.plot(x_fit, y_fit, label="HMC")
 
-    popt, pcov = opt.curve_fit(fit_function, x_wo_bias_correction_multi_hmc, y_w_bias_correction_multi_hmc,
-                               sigma=yerr_wo_bias_correction_multi_hmc)
+    popt, pcov = power_law_fit(x_wo_bias_correction_multi_hmc, y_w_bias_correction_multi_hmc,
+                               yerr_wo_bias_correction_multi_hmc)
     # print("Multilevel w_bias_correction", observable_name, popt, np.sqrt(pcov[0, 0]), np.sqrt(pcov[1, 1]))
     y_fit = fit_function(x_fit, *popt)
     ax2_.plot(x_fit, y_fit, label="Multilevel")
@@ -456,35 +514,30 @@ def info_plot(sub_folder_name, observable_name=magnetization_name):
 
     fig_.set_tight_layout(True)
 
-    fig_.savefig(sub_folder_name + observable_name + sub_folder_name[:-1] + ".png", dpi=1000)
-    fig_.clear()
+    fig_.savefig(sub_folder_name + observable_name + sub_folder_name[:-1] + ".png", dpi=publication_dpi)
+    plt.close(fig_)
+    plt.close(unsaved_fig_)
 
 
 def check_thermalisation(sub_folder_name, observable_name=field_squared_name):
-    observable_values = []
-    file_list = []
-    for file in os.listdir(sub_folder_name):
-        if file.startswith("out_"):
-            file_list.append(sub_folder_name + file)
+    file_list = list_measurement_files(sub_folder_name)
 
     for file in file_list:
         print(file)
-        f = h5py.File(file, 'r')
-
-        level0_group = f.get("level0")
+        with open_measurement_file(file) as f:
+            level0_group = f.get("level0")
 
-        measurements_group = level0_group.get("measurements")
-        if observable_name in measurements_group:
-            observable_group = measurements_group.get(observable_name)
-            observable_values.append(observable_group.get("data"))
-        else:
-            observable_values.append([])
+            measurements_group = level0_group.get("measurements")
+            if observable_name in measurements_group:
+                observable_group = measurements_group.get(observable_name)
+                observable_value_list = observable_group["data"][()]
+            else:
+                observable_value_list = np.empty(0)
 
-    for i, observable_value_list in enumerate(observable_values):
         fig_, ax1_ = plt.subplots(1, 1, figsize=(12, 9))
         fig_: plt.Figure
         ax1_: plt.Axes
-        ax1_.scatter(np.arange(len(observable_value_list)), observable_value_list, label=file_list[i])
+        ax1_.scatter(np.arange(len(observable_value_list)), observable_value_list, label=file)
 
         ax1_.set_title("Without bias correction")
         fig_.legend(loc="upper right")
@@ -495,65 +548,75 @@ def check_thermalisation(sub_folder_name, observable_name=field_squared_name):
         # ax1_.set_yscale('log')
 
         fig_.savefig(sub_folder_name + observable_name + sub_folder_name[:-1] +
-                     file_list[i].split("/")[1].split(".")[0] + ".png", dpi=1000)
-        fig_.clear()
+                     file.split("/")[1].split(".")[0] + ".png", dpi=diagnostic_dpi)
+        plt.close(fig_)
+
+
+def make_hmc_base_lines_to_axes(base_int_auto_correlation_time, base_tick_time, ax1_, ax2_, ax3_):
+    # the plain hmc runs are reference lines over the whole x range, the returned proxy is their legend entry
+    for base_tau, base_t in zip(np.atleast_1d(base_int_auto_correlation_time), np.atleast_1d(base_tick_time)):
+        ax1_.axhline(base_tau, color=tab_colors[-1])
+        ax2_.axhline(base_t, color=tab_colors[-1])
+        ax3_.axhline(base_tau * base_t, color=tab_colors[-1])
+    return Line2D([], [], color=tab_colors[-1])
 
 
 def crit_int_auto_correlation_plot_multiple_levels(sub_folder_name, observable_name=magnetization_name):
-    int_auto_correlation_time = []
-    int_auto_correlation_time_bias = []
-    int_auto_correlation_time_stat_error = []
-    gamma = []
-    tick_time = []
-    interpolation_type = []
-    nu_pre_level0 = []
-    nu_post_level0 = []
-    nu_pre_level_x = []
-    nu_post_level_x = []
-    file_list = []
-    for file in os.listdir(sub_folder_name):
-        if file.startswith("out_"):
-            file_list.append(sub_folder_name + file)
+    file_list = list_measurement_files(sub_folder_name)
+
+    n = len(file_list)
+    int_auto_correlation_time = np.empty(n)
+    int_auto_correlation_time_bias = np.empty(n)
+    int_auto_correlation_time_stat_error = np.empty(n)
+    gamma = np.empty(n)
+    tick_time = np.empty(n)
+    interpolation_type = np.empty(n, dtype=int)
+    nu_pre_level0 = np.empty(n, dtype=int)
+    nu_post_level0 = np.empty(n, dtype=int)
+    nu_pre_level_x = np.full((n, 9), -1)
+    nu_post_level_x = np.full((n, 9), -1)
+    has_observable = np.zeros(n, dtype=bool)
+    # position of the first plain HMC run among the files that have the observable
+    base_index = -1
+    n_stored = 0
 
-    for file in file_list:
+    for k, file in enumerate(file_list):
         print(file)
-        f = h5py.File(file, 'r')
-
-        level0_group = f.get("level0")
+        with open_measurement_file(file) as f:
+            level0_group = f.get("level0")
 
-        measurements_group = level0_group.get("measurements")
-        if observable_name in measurements_group:
-            observable_group = measurements_group.get(observable_name)
-            int_auto_correlation_time.append(observable_group.attrs["int_auto_correlation_time"])
-            int_auto_correlation_time_bias.append(observable_group.attrs["int_auto_correlation_time_bias"])
-            int_auto_correlation_time_stat_error.append(
-                observable_group.attrs["int_auto_correlation_time_stat_error"])
-            gamma.append(level0_group.attrs["gamma"])
-            tick_time.append(level0_group.attrs["tick_time"])
-            interpolation_type.append(level0_group.attrs["inter_type"])
-            nu_pre_level0.append(level0_group.attrs["nu_pre"])
-            nu_post_level0.append(level0_group.attrs["nu_post"])
-            temp_pre = []
-            temp_post = []
-            for i in range(1, 10):
-                if f"level{i}" in f:
-                    level_x_group = f.get(f"level{i}")
-                    temp_pre.append(level_x_group.attrs["nu_pre"])
-                    temp_post.append(level_x_group.attrs["nu_post"])
-                else:
-                    temp_pre.append(-1)
-                    temp_post.append(-1)
-            nu_pre_level_x.append(temp_pre)
-            nu_post_level_x.append(temp_post)
-
-    int_auto_correlation_time = np.array(int_auto_correlation_time)
-    int_auto_correlation_time_bias = np.array(int_auto_correlation_time_bias)
-    int_auto_correlation_time_stat_error = np.array(int_auto_correlation_time_stat_error)
-    gamma = np.array(gamma)
-    tick_time = np.array(tick_time)
-    interpolation_type = np.array(interpolation_type)
-    nu_pre_level0 = np.array(nu_pre_level0)
-    nu_post_level0 = np.array(nu_post_level0)
+            measurements_group = level0_group.get("measurements")
+            if observable_name in measurements_group:
+                observable_group = measurements_group.get(observable_name)
+                has_observable[k] = True
+                int_auto_correlation_time[k] = observable_group.attrs["int_auto_correlation_time"]
+                int_auto_correlation_time_bias[k] = observable_group.attrs["int_auto_correlation_time_bias"]
+                int_auto_correlation_time_stat_error[k] = observable_group.attrs[
+                    "int_auto_correlation_time_stat_error"]
+                gamma[k] = level0_group.attrs["gamma"]
+                tick_time[k] = level0_group.attrs["tick_time"]
+                interpolation_type[k] = level0_group.attrs["inter_type"]
+                nu_pre_level0[k] = level0_group.attrs["nu_pre"]
+                nu_post_level0[k] = level0_group.attrs["nu_post"]
+                for i in range(1, 10):
+                    if f"level{i}" in f:
+                        level_x_group = f.get(f"level{i}")
+                        nu_pre_level_x[k, i - 1] = level_x_group.attrs["nu_pre"]
+                        nu_post_level_x[k, i - 1] = level_x_group.attrs["nu_post"]
+                if base_index == -1 and nu_pre_level_x[k, 0] == -1:
+                    base_index = n_stored
+                n_stored += 1
+
+    int_auto_correlation_time = int_auto_correlation_time[has_observable]
+    int_auto_correlation_time_bias = int_auto_correlation_time_bias[has_observable]
+    int_auto_correlation_time_stat_error = int_auto_correlation_time_stat_error[has_observable]
+    gamma = gamma[has_observable]
+    tick_time = tick_time[has_observable]
+    interpolation_type = interpolation_type[has_observable]
+    nu_pre_level0 = nu_pre_level0[has_observable]
+    nu_post_level0 = nu_post_level0[has_observable]
+    nu_pre_level_x = nu_pre_level_x[has_observable]
+    nu_post_level_x = nu_post_level_x[has_observable]
     fig_, (ax1_, ax2_, ax3_) = plt.subplots(3, 1, sharex="all", sharey="row", figsize=(12, 5))
     fig_: plt.Figure
     ax1_: plt.Axes
@@ -561,51 +624,30 @@ def crit_int_auto_correlation_plot_multiple_levels(sub_folder_name, observable_n
     ax3_: plt.Axes
     j = 0
     fig_.subplots_adjust(hspace=0, wspace=0)
-    base_index = -1
-    for i, nu_pre in enumerate(nu_pre_level_x):
-        if nu_pre[0] == -1:
-            base_index = i
-            break
     base_int_auto_correlation_time = int_auto_correlation_time[base_index]
     base_tick_time = tick_time[base_index]
     ls = []
     labels = []
 
-    ls.append(ax1_.hlines(base_int_auto_correlation_time, 0, 10, colors=list(mcolors.TABLEAU_COLORS.values())[-1]))
+    ls.append(make_hmc_base_lines_to_axes(base_int_auto_correlation_time, base_tick_time, ax1_, ax2_, ax3_))
     labels.append("HMC")
-    ax2_.hlines(base_tick_time, 0, 10, colors=list(mcolors.TABLEAU_COLORS.values())[-1])
-    ax3_.hlines(base_int_auto_correlation_time * base_tick_time, 0, 10,
-                colors=list(mcolors.TABLEAU_COLORS.values())[-1])
-
-    x_plot = []
-    y1_plot = []
-    y1_error = []
-    y2_plot = []
-    for i, nu_pre in enumerate(nu_pre_level_x):
-        length = -1
-        for j in range(10):
-            if nu_pre[j] == -1:
-                length = j + 1  # +1 because of level 0
-                break
-        if length > 1:
-            x_plot.append(length)
-            y1_plot.append(int_auto_correlation_time[i])
-            y1_error.append(int_auto_correlation_time_stat_error[i] + int_auto_correlation_time_bias[i])
-            y2_plot.append(tick_time[i])
 
-    x_plot = np.array(x_plot)
-    y1_plot = np.array(y1_plot)
-    y1_error = np.array(y1_error)
-    y2_plot = np.array(y2_plot)
+    # level 0 plus the levels in front of the first unused (-1) slot
+    n_levels = np.cumprod(nu_pre_level_x != -1, axis=1).sum(axis=1) + 1
+    multilevel = n_levels > 1
+    x_plot = n_levels[multilevel]
+    y1_plot = int_auto_correlation_time[multilevel]
+    y1_error = int_auto_correlation_time_stat_error[multilevel] + int_auto_correlation_time_bias[multilevel]
+    y2_plot = tick_time[multilevel]
 
     ls.append(ax1_.errorbar(x_plot, y1_plot, y1_error, marker='.', ls='',
-                            c=list(mcolors.TABLEAU_COLORS.values())[j]))
+                            c=tab_colors[j]))
     labels.append(f"nu pre=1")
 
-    ax2_.plot(x_plot, y2_plot, marker='.', ls='', c=list(mcolors.TABLEAU_COLORS.values())[j])
+    ax2_.plot(x_plot, y2_plot, marker='.', ls='', c=tab_colors[j])
 
     ax3_.errorbar(x_plot, y1_plot * y2_plot, y1_error * y2_plot, marker='.', ls='',
-                  c=list(mcolors.TABLEAU_COLORS.values())[j])
+                  c=tab_colors[j])
 
     fig_.legend(ls, labels, loc="upper right")
     fig_.subplots_adjust(right=0.85)
@@ -619,94 +661,109 @@ def crit_int_auto_correlation_plot_multiple_levels(sub_folder_name, observable_n
     ax3_.set_ylabel(r"$t*\tau$")
     # ax3_.set_xscale('log')
     # ax3_.set_yscale('log')
-    fig_.savefig(sub_folder_name + observable_name + sub_folder_name[:-1] + ".png", dpi=1000)
-    fig_.clear()
+    fig_.savefig(sub_folder_name + observable_name + sub_folder_name[:-1] + ".png", dpi=publication_dpi)
+    plt.close(fig_)
+
+
+def build_heatmaps(nu_pre_level1, nu_post_level1, int_auto_correlation_time, tick_time):
+    j = np.unique(nu_pre_level1)
+    k = np.unique(nu_post_level1)
+    j = j[(j >= 0) & (j < 33)]
+    k = k[(k >= 0) & (k < 33)]
+    # scatter every run into its (nu_pre, nu_post) cell, cells hit by more than one run stay empty
+    in_grid = (nu_pre_level1 >= 0) & (nu_pre_level1 < 33) & (nu_post_level1 >= 0) & (nu_post_level1 < 33)
+    row_index = np.searchsorted(j, nu_pre_level1[in_grid])
+    column_index = np.searchsorted(k, nu_post_level1[in_grid])
+    cell = row_index * len(k) + column_index
+    runs_per_cell = np.bincount(cell, minlength=len(j) * len(k)).reshape(len(j), len(k))
+    data1 = np.zeros((len(j), len(k)))
+    data2 = np.zeros((len(j), len(k)))
+    data1[row_index, column_index] = int_auto_correlation_time[in_grid]
+    data2[row_index, column_index] = tick_time[in_grid]
+    data1[runs_per_cell != 1] = 0
+    data2[runs_per_cell != 1] = 0
+    return data1, data2, data2 * data1
 
 
 def crit_int_auto_correlation_plot(sub_folder_name, observable_name=magnetization_name):
-    int_auto_correlation_time = []
-    int_auto_correlation_time_bias = []
-    int_auto_correlation_time_stat_error = []
-    gamma = []
-    tick_time = []
-    interpolation_type = []
-    nu_pre_level0 = []
-    nu_post_level0 = []
-    nu_pre_level1 = []
-    nu_post_level1 = []
-    for file in os.listdir(sub_folder_name):
-        if file.startswith("out_"):
-            file = sub_folder_name + file
-            print(file)
-            f = h5py.File(file, 'r')
-
+    file_list = list_measurement_files(sub_folder_name)
+
+    n = len(file_list)
+    # one row per quantity, the names are views of the rows so the runs can be masked with one copy per table
+    run_values = np.empty((5, n))
+    run_levels = np.empty((5, n), dtype=int)
+    (int_auto_correlation_time, int_auto_correlation_time_bias, int_auto_correlation_time_stat_error, gamma,
+     tick_time) = run_values
+    interpolation_type, nu_pre_level0, nu_post_level0, nu_pre_level1, nu_post_level1 = run_levels
+    has_observable = np.zeros(n, dtype=bool)
+
+    for k, file in enumerate(file_list):
+        print(file)
+        with open_measurement_file(file) as f:
             level0_group = f.get("level0")
 
             measurements_group = level0_group.get("measurements")
             if observable_name in measurements_group:
                 observable_group = measurements_group.get(observable_name)
-                int_auto_correlation_time.append(observable_group.attrs["int_auto_correlation_time"])
-                int_auto_correlation_time_bias.append(observable_group.attrs["int_auto_correlation_time_bias"])
-                int_auto_correlation_time_stat_error.append(
-                    observable_group.attrs["int_auto_correlation_time_stat_error"])
-                gamma.append(level0_group.attrs["gamma"])
-                tick_time.append(level0_group.attrs["tick_time"])
-                interpolation_type.append(level0_group.attrs["inter_type"])
-                nu_pre_level0.append(level0_group.attrs["nu_pre"])
-                nu_post_level0.append(level0_group.attrs["nu_post"])
+                has_observable[k] = True
+                int_auto_correlation_time[k] = observable_group.attrs["int_auto_correlation_time"]
+                int_auto_correlation_time_bias[k] = observable_group.attrs["int_auto_correlation_time_bias"]
+                int_auto_correlation_time_stat_error[k] = observable_group.attrs[
+                    "int_auto_correlation_time_stat_error"]
+                gamma[k] = level0_group.attrs["gamma"]
+                tick_time[k] = level0_group.attrs["tick_time"]
+                interpolation_type[k] = level0_group.attrs["inter_type"]
+                nu_pre_level0[k] = level0_group.attrs["nu_pre"]
+                nu_post_level0[k] = level0_group.attrs["nu_post"]
                 if "level1" in f:
                     level1_group = f.get("level1")
-                    nu_pre_level1.append(level1_group.attrs["nu_pre"])
-                    nu_post_level1.append(level1_group.attrs["nu_post"])
+                    nu_pre_level1[k] = level1_group.attrs["nu_pre"]
+                    nu_post_level1[k] = level1_group.attrs["nu_post"]
                 else:
-                    nu_pre_level1.append(-1)
-                    nu_post_level1.append(-1)
-
-    int_auto_correlation_time = np.array(int_auto_correlation_time)
-    int_auto_correlation_time_bias = np.array(int_auto_correlation_time_bias)
-    int_auto_correlation_time_stat_error = np.array(int_auto_correlation_time_stat_error)
-    gamma = np.array(gamma)
-    tick_time = np.array(tick_time)
-    interpolation_type = np.array(interpolation_type)
-    nu_pre_level0 = np.array(nu_pre_level0)
-    nu_post_level0 = np.array(nu_post_level0)
-    nu_pre_level1 = np.array(nu_pre_level1)
-    nu_post_level1 = np.array(nu_post_level1)
+                    nu_pre_level1[k] = -1
+                    nu_post_level1[k] = -1
+
+    if not has_observable.any():
+        return
+    (int_auto_correlation_time, int_auto_correlation_time_bias, int_auto_correlation_time_stat_error, gamma,
+     tick_time) = run_values[:, has_observable]
+    interpolation_type, nu_pre_level0, nu_post_level0, nu_pre_level1, nu_post_level1 = run_levels[:, has_observable]
+    int_auto_correlation_time_error = int_auto_correlation_time_stat_error + int_auto_correlation_time_bias
+    hmc = nu_pre_level1 == -1
+    base_int_auto_correlation_time = int_auto_correlation_time[hmc]
+    base_tick_time = tick_time[hmc]
     fig_, (ax1_, ax2_, ax3_) = plt.subplots(3, 1, sharex="all", sharey="row", figsize=(12, 5))
     fig_: plt.Figure
     ax1_: plt.Axes
     ax2_: plt.Axes
     ax3_: plt.Axes
-    j = 0
     fig_.subplots_adjust(hspace=0, wspace=0)
-    base_int_auto_correlation_time = int_auto_correlation_time[nu_pre_level1 == -1]
-    base_tick_time = tick_time[nu_pre_level1 == -1]
     ls = []
     labels = []
 
-    ls.append(ax1_.hlines(base_int_auto_correlation_time, 0, 512, colors=list(mcolors.TABLEAU_COLORS.values())[-1]))
+    ls.append(make_hmc_base_lines_to_axes(base_int_auto_correlation_time, base_tick_time, ax1_, ax2_, ax3_))
     labels.append("HMC")
-    ax2_.hlines(base_tick_time, 0, 512, colors=list(mcolors.TABLEAU_COLORS.values())[-1])
-    ax3_.hlines(base_int_auto_correlation_time * base_tick_time, 0, 512,
-                colors=list(mcolors.TABLEAU_COLORS.values())[-1])
-
-    for i in range(513):
-        indices = nu_pre_level1 == i
-        x_plot = nu_post_level1[indices]
-        y1_plot = int_auto_correlation_time[indices]
-        y1_error = int_auto_correlation_time_stat_error[indices] + int_auto_correlation_time_bias[indices]
-        y2_plot = tick_time[indices]
-        if len(x_plot):
-            ls.append(ax1_.errorbar(x_plot, y1_plot, y1_error, marker='.', ls='',
-                                    c=list(mcolors.TABLEAU_COLORS.values())[j]))
-            labels.append(f"nu pre={i}")
-
-            ax2_.plot(x_plot, y2_plot, marker='.', ls='', c=list(mcolors.TABLEAU_COLORS.values())[j])
-
-            ax3_.errorbar(x_plot, y1_plot * y2_plot, y1_error * y2_plot, marker='.', ls='',
-                          c=list(mcolors.TABLEAU_COLORS.values())[j])
 
-            j += 1
+    # all nu_pre groups share one errorbar and one scatter call per axes, colored by group
+    in_range = (nu_pre_level1 >= 0) & (nu_pre_level1 <= 512)
+    nu_pre_values, group = np.unique(nu_pre_level1[in_range], return_inverse=True)
+    group_colors = tab_cmap(np.arange(len(nu_pre_values)) % tab_cmap.N)
+    colors = group_colors[group]
+    x_plot = nu_post_level1[in_range]
+    y1_plot = int_auto_correlation_time[in_range]
+    y1_error = int_auto_correlation_time_error[in_range]
+    y2_plot = tick_time[in_range]
+    y3_plot = y1_plot * y2_plot
+    y3_error = y1_error * y2_plot
+    if len(x_plot):
+        ax1_.errorbar(x_plot, y1_plot, y1_error, fmt='none', ecolor=colors)
+        ax1_.scatter(x_plot, y1_plot, c=colors, marker='.')
+        ax2_.scatter(x_plot, y2_plot, c=colors, marker='.')
+        ax3_.errorbar(x_plot, y3_plot, y3_error, fmt='none', ecolor=colors)
+        ax3_.scatter(x_plot, y3_plot, c=colors, marker='.')
+    for j, i in enumerate(nu_pre_values):
+        ls.append(Line2D([], [], color=group_colors[j], marker='.', ls=''))
+        labels.append(f"nu pre={i}")
 
     fig_.legend(ls, labels, loc="upper right")
     fig_.subplots_adjust(right=0.85)
@@ -720,50 +777,21 @@ def crit_int_auto_correlation_plot(sub_folder_name, observable_name=magnetizatio
     ax3_.set_ylabel(r"$t*\tau$")
     ax3_.set_xscale('log')
     ax3_.set_yscale('log')
-    fig_.savefig(sub_folder_name + observable_name + sub_folder_name[:-1] + ".png", dpi=1000)
-    fig_.clear()
+    fig_.savefig(sub_folder_name + observable_name + sub_folder_name[:-1] + ".png", dpi=publication_dpi)
+    plt.close(fig_)
 
     fig_, (ax1_, ax2_, ax3_) = plt.subplots(1, 3, sharey="row")
     fig_.subplots_adjust(hspace=0, wspace=0)
-    j = []
-    k = []
-    for i in range(33):
-        if np.any(nu_pre_level1 == i):
-            j.append(i)
-        if np.any(nu_post_level1 == i):
-            k.append(i)
-    j = np.array(j)
-    k = np.array(k)
-    data1 = np.zeros((len(j), len(k)))
-    data2 = np.zeros((len(j), len(k)))
-    data3 = np.zeros((len(j), len(k)))
-    for i1, index1 in enumerate(np.sort(j)):
-        for i2, index2 in enumerate(np.sort(k)):
-            if np.logical_and(nu_pre_level1 == index1, nu_post_level1 == index2).sum() == 1:
-                data1[i1, i2] = int_auto_correlation_time[
-                    np.logical_and(nu_pre_level1 == index1, nu_post_level1 == index2)]
-                data2[i1, i2] = tick_time[np.logical_and(nu_pre_level1 == index1, nu_post_level1 == index2)]
-                data3[i1, i2] = tick_time[np.logical_and(nu_pre_level1 == index1, nu_post_level1 == index2)] * \
-                                int_auto_correlation_time[
-                                    np.logical_and(nu_pre_level1 == index1, nu_post_level1 == index2)]
-
-    im1 = ax1_.imshow(data1)
-    ax1_divider = make_axes_locatable(ax1_)
-    # Add an axes to the right of the main axes.
-    cax1 = ax1_divider.append_axes("right", size="7%", pad="2%")
-    fig_.colorbar(im1, cax=cax1)
-
-    im2 = ax2_.imshow(data2)
-    ax2_divider = make_axes_locatable(ax2_)
-    # Add an axes to the right of the main axes.
-    cax2 = ax2_divider.append_axes("right", size="7%", pad="2%")
-    fig_.colorbar(im2, cax=cax2)
-
-    im3 = ax3_.imshow(data3)
-    ax3_divider = make_axes_locatable(ax3_)
-    # Add an axes to the right of the main axes.
-    cax3 = ax3_divider.append_axes("right", size="7%", pad="2%")
-    fig_.colorbar(im3, cax=cax3)
+    data1, data2, data3 = build_heatmaps(nu_pre_level1, nu_post_level1, int_auto_correlation_time, tick_time)
+
+    for ax_, data in zip((ax1_, ax2_, ax3_), (data1, data2, data3)):
+        # the color limits are set from the grid directly instead of leaving imshow to autoscale
+        norm = mcolors.Normalize(data.min(), data.max()) if data.size else None
+        im = ax_.imshow(data, norm=norm, interpolation='nearest')
+        ax_divider = make_axes_locatable(ax_)
+        # Add an axes to the right of the main axes.
+        cax = ax_divider.append_axes("right", size="7%", pad="2%")
+        fig_.colorbar(im, cax=cax)
 
     ax1_.set_xlabel(r"$\nu_{pre}$")
     ax1_.set_ylabel(r"$\nu_{post}$")
@@ -776,8 +804,11 @@ def crit_int_auto_correlation_plot(sub_folder_name, observable_name=magnetizatio
     ax3_.set_title(r"$\tau$*t")
 
     fig_.set_tight_layout(True)
-    fig_.savefig(sub_folder_name + observable_name + sub_folder_name[:-1] + "_heatmap.png", dpi=1000)
-    fig_.clear()
+    # no date and a fixed hash salt, so the same data always gives the same file
+    with plt.rc_context({"svg.hashsalt": "heatmap"}):
+        fig_.savefig(sub_folder_name + observable_name + sub_folder_name[:-1] + "_heatmap.svg", dpi=heatmap_dpi,
+                     metadata={'Date': None})
+    plt.close(fig_)
 
     fig_, (ax1_, ax2_, ax3_) = plt.subplots(3, 1, sharex="all", sharey="row", figsize=(12, 5))
     fig_: plt.Figure
@@ -786,31 +817,26 @@ def crit_int_auto_correlation_plot(sub_folder_name, observable_name=magnetizatio
     ax3_: plt.Axes
     j = 0
     fig_.subplots_adjust(hspace=0, wspace=0)
-    base_int_auto_correlation_time = int_auto_correlation_time[nu_pre_level1 == -1]
-    base_tick_time = tick_time[nu_pre_level1 == -1]
     ls = []
     labels = []
 
-    ls.append(ax1_.hlines(base_int_auto_correlation_time, 0, 512, colors=list(mcolors.TABLEAU_COLORS.values())[-1]))
+    ls.append(make_hmc_base_lines_to_axes(base_int_auto_correlation_time, base_tick_time, ax1_, ax2_, ax3_))
     labels.append("HMC")
-    ax2_.hlines(base_tick_time, 0, 512, colors=list(mcolors.TABLEAU_COLORS.values())[-1])
-    ax3_.hlines(base_int_auto_correlation_time * base_tick_time, 0, 512,
-                colors=list(mcolors.TABLEAU_COLORS.values())[-1])
 
     indices = nu_pre_level1 == 1
     x_plot = gamma[indices]
     y1_plot = int_auto_correlation_time[indices]
-    y1_error = int_auto_correlation_time_stat_error[indices] + int_auto_correlation_time_bias[indices]
+    y1_error = int_auto_correlation_time_error[indices]
     y2_plot = tick_time[indices]
     if len(x_plot):
         ls.append(ax1_.errorbar(x_plot, y1_plot, y1_error, marker='.', ls='',
-                                c=list(mcolors.TABLEAU_COLORS.values())[j]))
+                                c=tab_colors[j]))
         labels.append(f"nu pre={1}")
 
-        ax2_.plot(x_plot, y2_plot, marker='.', ls='', c=list(mcolors.TABLEAU_COLORS.values())[j])
+        ax2_.plot(x_plot, y2_plot, marker='.', ls='', c=tab_colors[j])
 
         ax3_.errorbar(x_plot, y1_plot * y2_plot, y1_error * y2_plot, marker='.', ls='',
-                      c=list(mcolors.TABLEAU_COLORS.values())[j])
+                      c=tab_colors[j])
 
         j += 1
 
@@ -826,8 +852,8 @@ def crit_int_auto_correlation_plot(sub_folder_name, observable_name=magnetizatio
     ax3_.set_ylabel(r"$t*\tau$")
     ax3_.set_xscale('log')
     ax3_.set_yscale('log')
-    fig_.savefig(sub_folder_name + observable_name + sub_folder_name[:-1] + "_gamma.png", dpi=1000)
-    fig_.clear()
+    fig_.savefig(sub_folder_name + observable_name + sub_folder_name[:-1] + "_gamma.png", dpi=publication_dpi)
+    plt.close(fig_)
 
 
 # crit_int_auto_correlation_plot("gs_16_CB_ga_1_levels_2/")